@@ -4,10 +4,10 @@ Run: streamlit run app.py
 """
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import sqlite3
 import sys
 from pathlib import Path
 
@@ -80,6 +80,44 @@ st.markdown("""
 def load_engine():
     return RecommendationEngine()
 
+MAX_RULES_SHOWN = 1000
+
+RULES_RENAME_MAP = {
+    "antecedents_str":"IF (Antecedent)",
+    "consequents_str":"THEN (Consequent)",
+    "support":"Support",
+    "confidence":"Confidence",
+    "lift":"Lift",
+}
+
+@st.cache_data(show_spinner=False)
+def build_rules_view(search: str, sort_by: str) -> pd.DataFrame:
+    # Read-only: filter rows, then take just the displayed columns (no full copy)
+    rules_df = load_engine().rules
+    q = search.lower()
+    if q and "_search_blob" in rules_df.columns:
+        rules_df = rules_df[rules_df["_search_blob"].str.contains(q, regex=False, na=False)]
+    elif q:
+        # Model without both text columns: search whichever of them it has
+        text_cols = [c for c in ("antecedents_str", "consequents_str") if c in rules_df.columns]
+        if text_cols:
+            mask = np.logical_or.reduce([
+                rules_df[c].str.lower().str.contains(q, regex=False, na=False) for c in text_cols
+            ])
+            rules_df = rules_df[mask]
+
+    cols = [c for c in RULES_RENAME_MAP if c in rules_df.columns]
+    disp = rules_df[cols].rename(columns=RULES_RENAME_MAP)
+    return disp.sort_values(sort_by, ascending=False)
+
+@st.cache_data(show_spinner=False)
+def build_rules_csv(search: str, sort_by: str) -> str:
+    return build_rules_view(search, sort_by).to_csv(index=False, lineterminator="\n")
+
+@st.cache_data(ttl=300)
+def get_kpis():
+    return RecommendationEngine.get_kpis()
+
 @st.cache_data(ttl=300)
 def get_product_freq():
     return RecommendationEngine.get_product_frequency(30)
@@ -98,6 +136,56 @@ try:
 except FileNotFoundError:
     model_loaded = False
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# Fragments (rerun on their own widgets without re-running the page)
+# ═══════════════════════════════════════════════════════════════════════════════
+@st.fragment
+def recs_panel(engine, top_n, min_conf, min_lift):
+    """Basket builder + results; its widgets rerun only this panel."""
+    all_items = engine.get_all_items()
+    selected = st.multiselect(
+        "Select items already in your basket:",
+        options=all_items,
+        placeholder="Start typing a product name…",
+    )
+
+    # Text input as alternative
+    st.markdown("**Or type custom items:**")
+    custom_input = st.text_input("Comma-separated", placeholder="e.g. Bread, Milk")
+    if custom_input:
+        custom_items = [i.strip().title() for i in custom_input.split(",") if i.strip()]
+        selected = list(set(selected + custom_items))
+
+    if selected:
+        st.markdown("**Current basket:**")
+        st.markdown(" ".join([f"`{item}`" for item in selected]))
+
+    get_recs = st.button("🔍 Get Recommendations", use_container_width=True)
+
+    if get_recs and selected:
+        recs = engine.recommend(selected, top_n=top_n,
+                                min_confidence=min_conf, min_lift=min_lift)
+
+        if recs.empty:
+            st.warning("No recommendations found. Try adding more items or adjusting filters.")
+        else:
+            st.markdown(f'<div class="section-header">✨ Recommended for You ({len(recs)})</div>',
+                        unsafe_allow_html=True)
+            for i, row in recs.iterrows():
+                conf_pct = int(row["confidence"] * 100)
+                lift_val = row["lift"]
+                st.markdown(f"""
+                <div class="rec-card">
+                    <h4>#{i+1} &nbsp; {row['product']}</h4>
+                    <span class="badge badge-blue">Confidence: {conf_pct}%</span>
+                    <span class="badge badge-green">Lift: {lift_val:.2f}x</span>
+                    <span class="badge badge-orange">Support: {row['support']:.3f}</span>
+                    <br><small style="color:#6a7c99">Based on: {row['based_on']}</small>
+                </div>
+                """, unsafe_allow_html=True)
+    elif get_recs and not selected:
+        st.info("Please select at least one product.")
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # Sidebar
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -141,49 +229,7 @@ if "Recommendations" in page:
         st.markdown('<div class="section-header">🧺 Build Your Basket</div>', unsafe_allow_html=True)
 
         if model_loaded:
-            all_items = engine.get_all_items()
-            selected = st.multiselect(
-                "Select items already in your basket:",
-                options=all_items,
-                placeholder="Start typing a product name…",
-            )
-
-            # Text input as alternative
-            st.markdown("**Or type custom items:**")
-            custom_input = st.text_input("Comma-separated", placeholder="e.g. Bread, Milk")
-            if custom_input:
-                custom_items = [i.strip().title() for i in custom_input.split(",") if i.strip()]
-                selected = list(set(selected + custom_items))
-
-            if selected:
-                st.markdown("**Current basket:**")
-                st.markdown(" ".join([f"`{item}`" for item in selected]))
-
-            get_recs = st.button("🔍 Get Recommendations", use_container_width=True)
-
-            if get_recs and selected:
-                recs = engine.recommend(selected, top_n=top_n,
-                                        min_confidence=min_conf, min_lift=min_lift)
-
-                if recs.empty:
-                    st.warning("No recommendations found. Try adding more items or adjusting filters.")
-                else:
-                    st.markdown(f'<div class="section-header">✨ Recommended for You ({len(recs)})</div>',
-                                unsafe_allow_html=True)
-                    for i, row in recs.iterrows():
-                        conf_pct = int(row["confidence"] * 100)
-                        lift_val = row["lift"]
-                        st.markdown(f"""
-                        <div class="rec-card">
-                            <h4>#{i+1} &nbsp; {row['product']}</h4>
-                            <span class="badge badge-blue">Confidence: {conf_pct}%</span>
-                            <span class="badge badge-green">Lift: {lift_val:.2f}x</span>
-                            <span class="badge badge-orange">Support: {row['support']:.3f}</span>
-                            <br><small style="color:#6a7c99">Based on: {row['based_on']}</small>
-                        </div>
-                        """, unsafe_allow_html=True)
-            elif get_recs and not selected:
-                st.info("Please select at least one product.")
+            recs_panel(engine, top_n, min_conf, min_lift)
         else:
             st.error("Run setup scripts first (see About page).")
 
@@ -192,19 +238,21 @@ if "Recommendations" in page:
         try:
             freq_df = get_product_freq()
             if not freq_df.empty:
+                top = freq_df.head(15)
+                counts = top["Frequency"].to_numpy(dtype=np.int32)
                 fig = px.bar(
-                    freq_df.head(15),
-                    x="Frequency", y="Product", orientation="h",
-                    color="Frequency",
+                    x=counts, y=top["Product"].to_numpy(), orientation="h",
+                    color=counts,
                     color_continuous_scale=["#0d47a1", "#4fc3f7", "#00e5ff"],
                     template="plotly_dark",
-                    labels={"Frequency": "Transaction Count"},
+                    labels={"x": "Transaction Count", "y": "Product", "color": "Transaction Count"},
                 )
                 fig.update_layout(
                     plot_bgcolor="#1a1d27", paper_bgcolor="#1a1d27",
                     height=450, showlegend=False,
                     margin=dict(l=10, r=10, t=10, b=10),
                     yaxis=dict(categoryorder="total ascending"),
+                    uirevision="top-products",
                 )
                 st.plotly_chart(fig, use_container_width=True)
         except Exception as e:
@@ -219,12 +267,7 @@ elif "Dashboard" in page:
 
     # KPI cards
     try:
-        DB = Path(__file__).parent / "data" / "retail_store.db"
-        conn = sqlite3.connect(DB)
-        total_tx   = pd.read_sql("SELECT COUNT(DISTINCT InvoiceID) as n FROM Transactions", conn).iloc[0,0]
-        total_prod = pd.read_sql("SELECT COUNT(DISTINCT Product) as n FROM Transactions", conn).iloc[0,0]
-        total_qty  = pd.read_sql("SELECT SUM(Quantity) as n FROM Transactions", conn).iloc[0,0]
-        conn.close()
+        total_tx, total_prod, total_qty = get_kpis()
         n_rules = len(engine.rules) if model_loaded else 0
 
         c1, c2, c3, c4 = st.columns(4)
@@ -248,11 +291,14 @@ elif "Dashboard" in page:
         st.markdown("**🗓️ Monthly Transaction Volume**")
         try:
             monthly = get_monthly_sales()
-            fig = px.area(monthly, x="Month", y="Transactions",
+            fig = px.area(x=monthly["Month"].to_numpy(),
+                          y=monthly["Transactions"].to_numpy(dtype=np.int32),
+                          labels={"x": "Month", "y": "Transactions"},
                           template="plotly_dark",
                           color_discrete_sequence=["#4fc3f7"])
             fig.update_layout(plot_bgcolor="#1a1d27", paper_bgcolor="#1a1d27",
-                              margin=dict(l=0,r=0,t=10,b=0), height=300)
+                              margin=dict(l=0,r=0,t=10,b=0), height=300,
+                              uirevision="monthly")
             st.plotly_chart(fig, use_container_width=True)
         except Exception as e:
             st.info(f"Chart unavailable: {e}")
@@ -261,11 +307,15 @@ elif "Dashboard" in page:
         st.markdown("**🌍 Sales by Country**")
         try:
             country = get_country_sales()
-            fig = px.pie(country.head(8), names="Country", values="Transactions",
+            top = country.head(8)
+            fig = px.pie(names=top["Country"].to_numpy(),
+                         values=top["Transactions"].to_numpy(dtype=np.int32),
+                         labels={"names": "Country", "values": "Transactions"},
                          template="plotly_dark",
                          color_discrete_sequence=px.colors.sequential.Blues_r)
             fig.update_layout(plot_bgcolor="#1a1d27", paper_bgcolor="#1a1d27",
-                              margin=dict(l=0,r=0,t=10,b=0), height=300)
+                              margin=dict(l=0,r=0,t=10,b=0), height=300,
+                              uirevision="country")
             st.plotly_chart(fig, use_container_width=True)
         except Exception as e:
             st.info(f"Chart unavailable: {e}")
@@ -275,6 +325,9 @@ elif "Dashboard" in page:
         try:
             top_rules = engine.top_rules(20)
             if not top_rules.empty:
+                top_rules = top_rules.astype({"support": np.float32,
+                                              "confidence": np.float32,
+                                              "lift": np.float32})
                 fig = px.scatter(
                     top_rules,
                     x="confidence", y="lift", size="support",
@@ -285,7 +338,8 @@ elif "Dashboard" in page:
                     labels={"confidence":"Confidence","lift":"Lift"},
                 )
                 fig.update_layout(plot_bgcolor="#1a1d27", paper_bgcolor="#1a1d27",
-                                  height=350, margin=dict(l=0,r=0,t=20,b=0))
+                                  height=350, margin=dict(l=0,r=0,t=20,b=0),
+                                  uirevision="top-bundles")
                 st.plotly_chart(fig, use_container_width=True)
         except Exception as e:
             st.info(f"Chart unavailable: {e}")
@@ -297,34 +351,20 @@ elif "Rules" in page:
     st.markdown('<div class="section-header">📋 All Association Rules</div>', unsafe_allow_html=True)
 
     if model_loaded:
-        rules_df = engine.rules.copy()
-        display_cols = ["antecedents_str","consequents_str","support","confidence","lift"]
-        display_cols = [c for c in display_cols if c in rules_df.columns]
-        disp = rules_df[display_cols].rename(columns={
-            "antecedents_str":"IF (Antecedent)",
-            "consequents_str":"THEN (Consequent)",
-            "support":"Support",
-            "confidence":"Confidence",
-            "lift":"Lift",
-        })
-
-        col1, col2 = st.columns(2)
-        with col1:
-            search = st.text_input("🔍 Search product", placeholder="e.g. Bread")
-        with col2:
-            sort_by = st.selectbox("Sort by", ["Lift", "Confidence", "Support"], index=0)
-
-        if search:
-            mask = (
-                disp["IF (Antecedent)"].str.contains(search, case=False, na=False) |
-                disp["THEN (Consequent)"].str.contains(search, case=False, na=False)
-            )
-            disp = disp[mask]
-
-        disp = disp.sort_values(sort_by, ascending=False)
+        # Filter only runs on submit, not on every keystroke
+        with st.form("rules_filter", border=False):
+            col1, col2 = st.columns(2)
+            with col1:
+                search = st.text_input("🔍 Search product", placeholder="e.g. Bread")
+            with col2:
+                sort_by = st.selectbox("Sort by", ["Lift", "Confidence", "Support"], index=0)
+            st.form_submit_button("Apply")
+
+        disp = build_rules_view(search, sort_by)
+        disp_view = disp.head(MAX_RULES_SHOWN)   # full set stays in the CSV download
 
         st.dataframe(
-            disp,
+            disp_view,
             use_container_width=True,
             height=500,
             column_config={
@@ -333,12 +373,12 @@ elif "Rules" in page:
                 "Lift":       st.column_config.NumberColumn("Lift", format="%.2f"),
             }
         )
-        st.caption(f"Showing {len(disp):,} rules")
+        st.caption(f"Showing top {len(disp_view):,} of {len(disp):,} rules")
 
         # Download
         st.download_button(
             "⬇️ Download Rules CSV",
-            data=disp.to_csv(index=False),
+            data=build_rules_csv(search, sort_by),
             file_name="association_rules.csv",
             mime="text/csv",
         )
@@ -1,133 +1,354 @@
 """
 fp_growth_engine.py
-Pure-Python FP-Growth + Association Rules
+FP-Growth + Association Rules
 No mlxtend required — works offline.
+If PyFIM is installed (`pip install pyfim`), mining runs in its C
+implementation; otherwise the pure-Python FP-tree below is used.
 """
 
 from __future__ import annotations
-from collections import defaultdict
-from itertools import combinations
+from collections import Counter, defaultdict
+from itertools import chain, combinations
 from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+
+try:
+    import fim as _fim                   # Borgelt's PyFIM (native)
+except ImportError:
+    _fim = None
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Fallback when Numba is missing: run the kernels as plain Python."""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# FP-Tree node
+# CSR kernels (transactions as int32 item IDs + int64 offsets)
 # ═══════════════════════════════════════════════════════════════════════════════
-class FPNode:
-    def __init__(self, item, parent=None):
-        self.item    = item
-        self.count   = 0
-        self.parent  = parent
-        self.children: Dict[str, FPNode] = {}
-        self.link: Optional[FPNode] = None   # header table link
-
-    def increment(self, count: int = 1):
-        self.count += count
+def _to_csr(rows, weights=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pack item-ID rows into flat items, row offsets and weights (default 1)."""
+    lengths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    items = np.fromiter(chain.from_iterable(rows), dtype=np.int32, count=offsets[-1])
+    if weights is None:
+        weights = np.ones(len(rows), dtype=np.int64)
+    return items, offsets, np.asarray(weights, dtype=np.int64)
+
+
+def count_freq(items, offsets, weights, n_items):
+    """Weighted item counts via np.bincount (vectorised with or without Numba)."""
+    if not (weights == 1).all():
+        return np.bincount(items, weights=np.repeat(weights, np.diff(offsets)),
+                           minlength=n_items).astype(np.int64)
+    return np.bincount(items, minlength=n_items).astype(np.int64, copy=False)
+
+
+@njit(cache=True)
+def filter_and_sort(items, offsets, freq, min_support):
+    """Drop infrequent items and order each row by (-freq, item)."""
+    n_items = freq.shape[0]
+    order = np.argsort(-freq * n_items + np.arange(n_items), kind="mergesort")
+    rank = np.empty(n_items, dtype=np.int64)
+    for r in range(n_items):
+        rank[order[r]] = r
+
+    n_rows = offsets.shape[0] - 1
+    out_items = np.empty(items.shape[0], dtype=np.int32)
+    out_offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    pos = 0
+    for row in range(n_rows):
+        start = pos
+        for k in range(offsets[row], offsets[row + 1]):
+            if freq[items[k]] >= min_support:
+                out_items[pos] = rank[items[k]]
+                pos += 1
+        out_items[start:pos] = np.sort(out_items[start:pos])
+        for k in range(start, pos):
+            out_items[k] = order[out_items[k]]
+        out_offsets[row + 1] = pos
+    return out_items[:pos], out_offsets
+
+
+@njit(cache=True)
+def _chain_support(head, link_next, count):
+    support = 0
+    node = head
+    while node != -1:
+        support += count[node]
+        node = link_next[node]
+    return support
+
+
+@njit(cache=True)
+def _prefix_paths(head, link_next, parent, node_item, count):
+    """Collect the root→node prefix of every node in an item's chain (CSR)."""
+    n_paths, total = 0, 0
+    node = head
+    while node != -1:
+        depth = 0
+        p = parent[node]
+        while p != 0:
+            depth += 1
+            p = parent[p]
+        if depth:
+            n_paths += 1
+            total += depth
+        node = link_next[node]
+
+    items = np.empty(total, dtype=np.int32)
+    offsets = np.zeros(n_paths + 1, dtype=np.int64)
+    counts = np.empty(n_paths, dtype=np.int64)
+    row = 0
+    node = head
+    while node != -1:
+        depth = 0
+        p = parent[node]
+        while p != 0:
+            depth += 1
+            p = parent[p]
+        if depth:
+            end = offsets[row] + depth
+            p = parent[node]
+            for k in range(end - 1, offsets[row] - 1, -1):
+                items[k] = node_item[p]
+                p = parent[p]
+            counts[row] = count[node]
+            offsets[row + 1] = end
+            row += 1
+        node = link_next[node]
+    return items, offsets, counts
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # FP-Tree
 # ═══════════════════════════════════════════════════════════════════════════════
 class FPTree:
-    def __init__(self, transactions, min_support: int, root_value=None, root_count=0):
-        self.root = FPNode(root_value)
-        self.root.count = root_count
-        self.header: Dict[str, FPNode] = {}   # item → first node in chain
+    """
+    FP-tree over integer item IDs in ``range(n_items)``, stored as parallel
+    node arrays. Node 0 is the root; ``link_next`` chains the nodes of one
+    item from ``header_head[item]`` to ``header_tail[item]`` and ends with -1.
 
-        self._build(transactions, min_support)
+    Built from weighted CSR rows (items, offsets, weights); use
+    ``from_transactions`` for plain lists of item IDs.
+    """
+
+    __slots__ = ("parent", "item", "count", "link_next", "header_head", "header_tail",
+                 "children", "size", "freq", "_sorted_items")
+
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, items, offsets, weights, min_support: int, n_items: int):
+        cap = self.INITIAL_CAPACITY
+        self.parent    = np.empty(cap, dtype=np.int32)
+        self.item      = np.empty(cap, dtype=np.int32)
+        self.count     = np.empty(cap, dtype=np.int64)
+        self.link_next = np.empty(cap, dtype=np.int32)
+        self.header_head = np.empty(n_items, dtype=np.int32)
+        self.header_tail = np.empty(n_items, dtype=np.int32)
+        self.children: Dict[Tuple[int, int], int] = {}   # (parent, item) → node
+
+        self.parent[0], self.item[0], self.count[0], self.link_next[0] = -1, -1, 0, -1
+        self.reset(items, offsets, weights, min_support)
+
+    def reset(self, items, offsets, weights, min_support: int):
+        """Rebuild the tree in place, reusing the already allocated node arrays."""
+        self.header_head.fill(-1)
+        self.header_tail.fill(-1)
+        self.children.clear()
+        self.size = 1
+        self._build(items, offsets, weights, min_support, len(self.header_head))
+
+    @classmethod
+    def from_transactions(cls, transactions, min_support: int, n_items: int, weights=None) -> "FPTree":
+        return cls(*_to_csr(transactions, weights), min_support, n_items)
+
+    @classmethod
+    def from_batches(cls, batches, freq: np.ndarray, min_support: int) -> "FPTree":
+        """
+        Build from an iterable of CSR (items, offsets) batches, given the
+        item frequencies over all batches (counted in an earlier pass).
+        """
+        tree = cls.from_transactions([], min_support, len(freq))
+        tree._set_freq(freq, min_support)
+        for items, offsets in batches:
+            weights = np.ones(len(offsets) - 1, dtype=np.int64)
+            tree._insert_rows(items, offsets, weights, freq, min_support)
+        return tree
 
     # ── Build ──────────────────────────────────────────────────────────────────
-    def _build(self, transactions, min_support: int):
+    def _build(self, items, offsets, weights, min_support: int, n_items: int):
         # 1. Count frequencies
-        freq: Dict[str, int] = defaultdict(int)
-        for t in transactions:
-            for item in t:
-                freq[item] += 1
-
-        # 2. Filter & sort each transaction by frequency desc
-        self.freq = {k: v for k, v in freq.items() if v >= min_support}
-
-        for transaction in transactions:
-            filtered = sorted(
-                [item for item in transaction if item in self.freq],
-                key=lambda x: (-self.freq[x], x)
-            )
-            if filtered:
-                self._insert(filtered)
-
-    def _insert(self, items: List[str]):
-        node = self.root
+        freq = count_freq(items, offsets, weights, n_items)
+        self._set_freq(freq, min_support)
+
+        # 2. Filter & sort each transaction by frequency desc, then insert
+        self._insert_rows(items, offsets, weights, freq, min_support)
+
+    def _set_freq(self, freq: np.ndarray, min_support: int):
+        self.freq = {int(i): int(freq[i]) for i in np.flatnonzero(freq >= min_support)}
+        # Mining order (least frequent first), fixed for the life of the tree
+        self._sorted_items = sorted(self.freq, key=self.freq.get)
+
+    def _insert_rows(self, items, offsets, weights, freq: np.ndarray, min_support: int):
+        items, offsets = filter_and_sort(items, offsets, freq, min_support)
+        items, offsets = items.tolist(), offsets.tolist()
+        for start, end, weight in zip(offsets, offsets[1:], weights.tolist()):
+            if start < end:
+                self._insert(items[start:end], weight)
+
+    def _grow(self):
+        cap = 2 * len(self.item)
+        for name in ("parent", "item", "count", "link_next"):
+            old = getattr(self, name)
+            new = np.empty(cap, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _insert(self, items: List[int], weight: int = 1):
+        # Hot loop: one dict probe per item, attribute lookups hoisted
+        children_get = self.children.get
+        count = self.count
+        node = 0
         for item in items:
-            if item in node.children:
-                node.children[item].increment()
+            child = children_get((node, item))
+            if child is not None:
+                count[child] += weight
             else:
-                new_node = FPNode(item, parent=node)
-                new_node.count = 1
-                node.children[item] = new_node
-                # update header chain
-                if item not in self.header:
-                    self.header[item] = new_node
-                else:
-                    current = self.header[item]
-                    while current.link:
-                        current = current.link
-                    current.link = new_node
-            node = node.children[item]
+                child = self._new_node(node, item, weight)
+                count = self.count   # may have been regrown
+            node = child
+
+    def _new_node(self, parent: int, item: int, weight: int) -> int:
+        if self.size == len(self.item):
+            self._grow()
+        child = self.size
+        self.size += 1
+        self.parent[child] = parent
+        self.item[child]   = item
+        self.count[child]  = weight
+        # append to the header chain in O(1) via its tail
+        self.link_next[child] = -1
+        tail = self.header_tail[item]
+        if tail == -1:
+            self.header_head[item] = child
+        else:
+            self.link_next[tail] = child
+        self.header_tail[item] = child
+        self.children[(parent, item)] = child
+        return child
 
     def is_empty(self) -> bool:
-        return len(self.root.children) == 0
+        return self.size == 1
+
+    def single_path(self) -> Optional[List[Tuple[int, int]]]:
+        """(item, count) from the root down if the tree is one chain, else None."""
+        n = self.size - 1
+        if not np.array_equal(self.parent[1:self.size], np.arange(n)):
+            return None
+        return list(zip(self.item[1:self.size].tolist(), self.count[1:self.size].tolist()))
+
+    def support(self, item: int) -> int:
+        return int(_chain_support(self.header_head[item], self.link_next, self.count))
 
     # ── Conditional pattern base ───────────────────────────────────────────────
-    def conditional_pattern_base(self, item: str) -> List[Tuple[List[str], int]]:
-        patterns = []
-        node = self.header.get(item)
-        while node:
-            prefix, count = [], node.count
-            parent = node.parent
-            while parent.item is not None:
-                prefix.append(parent.item)
-                parent = parent.parent
-            if prefix:
-                patterns.append((prefix[::-1], count))
-            node = node.link
-        return patterns
+    def prefix_paths(self, item: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Conditional pattern base as CSR (items, offsets, counts)."""
+        return _prefix_paths(
+            self.header_head[item], self.link_next, self.parent, self.item, self.count
+        )
+
+    def conditional_pattern_base(self, item: int) -> List[Tuple[List[int], int]]:
+        items, offsets, counts = self.prefix_paths(item)
+        items, offsets = items.tolist(), offsets.tolist()
+        return [
+            (items[start:end], count)
+            for start, end, count in zip(offsets, offsets[1:], counts.tolist())
+        ]
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # FP-Growth mining
 # ═══════════════════════════════════════════════════════════════════════════════
-def fpgrowth_mine(tree: FPTree, min_support: int, prefix: frozenset) -> List[Tuple[frozenset, int]]:
-    """Recursively mine frequent itemsets from the FP-tree."""
+def fpgrowth_mine(tree: FPTree, min_support: int, prefix: frozenset, n_items: int) -> List[Tuple[frozenset, int]]:
+    """
+    Mine frequent itemsets from the FP-tree, depth-first with an explicit
+    stack of (tree, prefix, remaining items). Single-path conditional trees
+    are expanded directly. Conditional trees that are fully mined go to a
+    pool and are rebuilt in place for the next one.
+    """
     itemsets = []
+    pool: List[FPTree] = []
+    stack = [(tree, prefix, iter(tree._sorted_items))]
+
+    while stack:
+        current, base, remaining = stack[-1]
+        item = next(remaining, None)
+        if item is None:
+            stack.pop()
+            if current is not tree:
+                pool.append(current)
+            continue
 
-    for item, node in sorted(tree.header.items(), key=lambda x: tree.freq.get(x[0], 0)):
-        new_itemset = prefix | {item}
-        support = 0
-        n = node
-        while n:
-            support += n.count
-            n = n.link
+        new_itemset = base | {item}
+        support = current.support(item)
 
         if support < min_support:
             continue
 
         itemsets.append((new_itemset, support))
 
-        # Build conditional tree
-        cond_patterns = tree.conditional_pattern_base(item)
-        cond_transactions = []
-        for pattern, count in cond_patterns:
-            cond_transactions.extend([pattern] * count)
-
-        if cond_transactions:
-            cond_tree = FPTree(cond_transactions, min_support)
-            if not cond_tree.is_empty():
-                sub_itemsets = fpgrowth_mine(cond_tree, min_support, new_itemset)
-                itemsets.extend(sub_itemsets)
+        # Build conditional tree straight from the CSR prefix paths,
+        # each weighted by its count
+        items, offsets, counts = current.prefix_paths(item)
+        if len(counts):
+            if pool:
+                cond_tree = pool.pop()
+                cond_tree.reset(items, offsets, counts, min_support)
+            else:
+                cond_tree = FPTree(items, offsets, counts, min_support, n_items)
+
+            path = cond_tree.single_path()
+            if path is not None:
+                # Every subset of a single path is frequent; its support is
+                # the count of its deepest node (counts only shrink downward)
+                for r in range(1, len(path) + 1):
+                    for combo in combinations(path, r):
+                        itemsets.append((new_itemset.union(i for i, _ in combo), combo[-1][1]))
+                pool.append(cond_tree)
+            else:
+                stack.append((cond_tree, new_itemset, iter(cond_tree._sorted_items)))
 
     return itemsets
 
 
+def _intern(transactions) -> Tuple[List[str], List[List[int]]]:
+    """Map each distinct product to a small int (ordered by name)."""
+    vocab = sorted({item for t in transactions for item in t})
+    id_of = {item: i for i, item in enumerate(vocab)}
+    return vocab, [[id_of[item] for item in t] for t in transactions]
+
+
+def _fpgrowth_python(transactions, min_count: int, n_items: int) -> List[Tuple[frozenset, int]]:
+    tree = FPTree.from_transactions(transactions, min_count, n_items)
+    return fpgrowth_mine(tree, min_count, frozenset(), n_items)
+
+
+def _fpgrowth_native(transactions, min_count: int, max_len: int) -> List[Tuple[frozenset, int]]:
+    """Mine with PyFIM; same (itemset, count) pairs as fpgrowth_mine()."""
+    # PyFIM drops items present in every transaction; a trailing empty
+    # basket avoids that without changing any absolute count.
+    tracts = chain(transactions, ([],))
+    raw = _fim.fpgrowth(tracts, target="s", supp=-min_count, zmax=max_len, report="a")
+    return [(frozenset(itemset), count) for itemset, count in raw]
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # Public API
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -148,20 +369,104 @@ def fpgrowth(transactions: List[List[str]], min_support: float = 0.02, max_len:
     n = len(transactions)
     min_count = max(1, int(min_support * n))
 
-    tree = FPTree(transactions, min_count)
-    raw  = fpgrowth_mine(tree, min_count, frozenset())
+    # Mine on int IDs; names come back only in the result
+    vocab, encoded = _intern(transactions)
+    if _fim is not None:
+        raw = _fpgrowth_native(encoded, min_count, max_len)
+    else:
+        raw = _fpgrowth_python(encoded, min_count, len(vocab))
+
+    return _format_itemsets(raw, vocab, n, max_len)
+
+
+def fpgrowth_from_parquet(path, basket_col: str = "items", min_support: float = 0.02,
+                          max_len: int = 4, batch_size: int = 100_000):
+    """
+    Mine frequent itemsets from a Parquet file without loading every basket.
+
+    ``basket_col`` must be a list-of-strings column, one row per basket.
+    Batches are read twice (count, then insert) with only that column
+    projected; items are dictionary-encoded per batch by Arrow, so Python
+    only hashes each distinct product once per batch.
+
+    Returns the same list of dicts as fpgrowth().
+    """
+    import pyarrow.parquet as pq
 
+    pf = pq.ParquetFile(path)
+
+    # Pass 1: basket count + per-product frequencies
+    n = 0
+    counts: Counter = Counter()
+    for batch in pf.iter_batches(columns=[basket_col], batch_size=batch_size):
+        n += batch.num_rows
+        indices, dictionary, _ = _arrow_basket_codes(batch.column(0))
+        counts.update(dict(zip(dictionary, np.bincount(indices, minlength=len(dictionary)).tolist())))
+
+    min_count = max(1, int(min_support * n))
+    vocab = sorted(counts)
+    id_of = {item: i for i, item in enumerate(vocab)}
+    freq  = np.array([counts[item] for item in vocab], dtype=np.int64)
+
+    # Pass 2: translate batch codes to global IDs and insert
+    def batches():
+        for batch in pf.iter_batches(columns=[basket_col], batch_size=batch_size):
+            indices, dictionary, offsets = _arrow_basket_codes(batch.column(0))
+            to_global = np.array([id_of[name] for name in dictionary], dtype=np.int32)
+            yield to_global[indices], offsets
+
+    tree = FPTree.from_batches(batches(), freq, min_count)
+    raw  = fpgrowth_mine(tree, min_count, frozenset(), len(vocab))
+    return _format_itemsets(raw, vocab, n, max_len)
+
+
+def _arrow_basket_codes(baskets) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """Dictionary codes, dictionary values and row offsets of a list<string> array."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = pc.list_flatten(baskets)
+    if not pa.types.is_dictionary(values.type):
+        values = values.dictionary_encode()
+    lengths = pc.list_value_length(baskets).fill_null(0).to_numpy(zero_copy_only=False)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    indices = values.indices.to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+    return indices, values.dictionary.to_pylist(), offsets
+
+
+def _format_itemsets(raw, vocab: List[str], n: int, max_len: int):
     result = []
     for itemset, count in raw:
         if len(itemset) <= max_len:
             result.append({
                 "support":  round(count / n, 6),
-                "itemsets": itemset,
+                "itemsets": frozenset(vocab[i] for i in itemset),
             })
+    return result
+
 
+def _round_list(values: np.ndarray, ndigits: int) -> List[float]:
+    """``[round(v, ndigits) for v in values]`` with NumPy doing all but near-ties."""
+    scale  = 10.0 ** ndigits
+    scaled = values * scale
+    # rint(x * 10^d) / 10^d is exactly round() unless x * 10^d sits on a .5 boundary
+    result = (np.rint(scaled) / scale).tolist()
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) <= 4 * np.spacing(np.abs(scaled))
+    for k in np.flatnonzero(near_tie).tolist():
+        result[k] = round(float(values[k]), ndigits)
     return result
 
 
+def _subset_masks(size: int) -> np.ndarray:
+    """Antecedent masks for a ``size``-itemset, in itertools.combinations order."""
+    return np.array([
+        [i in combo for i in range(size)]
+        for r in range(1, size)
+        for combo in combinations(range(size), r)
+    ], dtype=bool)
+
+
 def association_rules(frequent_itemsets, metric="confidence", min_threshold=0.4):
     """
     Generate association rules from frequent itemsets.
@@ -177,43 +482,96 @@ def association_rules(frequent_itemsets, metric="confidence", min_threshold=0.4)
     list of dicts with keys:
         antecedents, consequents, support, confidence, lift, leverage, conviction
     """
-    # Build support lookup
-    support_map = {fs["itemsets"]: fs["support"] for fs in frequent_itemsets}
-
-    rules = []
-    for fs in frequent_itemsets:
-        itemset = fs["itemsets"]
-        if len(itemset) < 2:
+    # Itemsets as rows of sorted column IDs with an integer code each, so rule
+    # sides are found by array lookups instead of per-candidate frozensets
+    names  = sorted({item for fs in frequent_itemsets for item in fs["itemsets"]})
+    col_of = {name: i for i, name in enumerate(names)}
+    id_rows  = [sorted(map(col_of.__getitem__, fs["itemsets"])) for fs in frequent_itemsets]
+    itemsets = np.empty(len(frequent_itemsets), dtype=object)
+    itemsets[:] = [fs["itemsets"] for fs in frequent_itemsets]
+    supports = np.array([fs["support"] for fs in frequent_itemsets], dtype=np.float64)
+
+    # Mixed-radix code over (ID + 1); Python ints if it could overflow int64
+    base = len(names) + 1
+    code_dtype = np.int64 if base ** max(map(len, id_rows), default=1) < 2 ** 63 else object
+
+    def encode(ids: np.ndarray) -> np.ndarray:
+        weights = np.array([base ** j for j in range(ids.shape[1])], dtype=code_dtype)
+        return (ids.astype(code_dtype) + 1) @ weights
+
+    by_size: Dict[int, List[int]] = defaultdict(list)
+    for pos, ids in enumerate(id_rows):
+        by_size[len(ids)].append(pos)
+    id_mats = {size: np.array([id_rows[p] for p in positions], dtype=np.int64)
+               for size, positions in by_size.items()}
+    codes = np.empty(len(id_rows), dtype=code_dtype)
+    for size, positions in by_size.items():
+        codes[positions] = encode(id_mats[size])
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+
+    def position_of(ids: np.ndarray) -> np.ndarray:
+        """Input position of each row's itemset (last duplicate wins); -1 if not frequent."""
+        code = encode(ids)
+        at = np.searchsorted(sorted_codes, code, side="right") - 1
+        found = (at >= 0) & (sorted_codes[np.maximum(at, 0)] == code)
+        return np.where(found, order[np.maximum(at, 0)], -1)
+
+    parts = []
+    for size, positions in by_size.items():
+        if size < 2:
             continue
-
-        for size in range(1, len(itemset)):
-            for antecedent in combinations(itemset, size):
-                antecedent  = frozenset(antecedent)
-                consequent  = itemset - antecedent
-
-                ant_support  = support_map.get(antecedent, 0)
-                cons_support = support_map.get(consequent, 0)
-                rule_support = fs["support"]
-
-                if ant_support == 0 or cons_support == 0:
-                    continue
-
-                confidence  = rule_support / ant_support
-                lift        = confidence / cons_support
-                leverage    = rule_support - ant_support * cons_support
-                conviction  = (1 - cons_support) / (1 - confidence + 1e-10) if confidence < 1 else float("inf")
-
-                value = confidence if metric == "confidence" else lift
-                if value >= min_threshold:
-                    rules.append({
-                        "antecedents": antecedent,
-                        "consequents": consequent,
-                        "support":     round(rule_support, 6),
-                        "confidence":  round(confidence, 6),
-                        "lift":        round(lift, 6),
-                        "leverage":    round(leverage, 6),
-                        "conviction":  round(min(conviction, 999.0), 4),
-                    })
-
-    rules.sort(key=lambda r: r["lift"], reverse=True)
-    return rules
+        masks = _subset_masks(size)
+        ids   = id_mats[size]
+
+        ant_pos  = np.stack([position_of(ids[:, m]) for m in masks], axis=1)
+        cons_pos = np.stack([position_of(ids[:, ~m]) for m in masks], axis=1)
+        ant_support  = np.where(ant_pos >= 0, supports[ant_pos], 0.0)
+        cons_support = np.where(cons_pos >= 0, supports[cons_pos], 0.0)
+        rule_support = supports[positions][:, None]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            confidence = rule_support / ant_support
+            lift       = confidence / cons_support
+            leverage   = rule_support - ant_support * cons_support
+            conviction = np.where(confidence < 1,
+                                  (1 - cons_support) / (1 - confidence + 1e-10), np.inf)
+
+            value = confidence if metric == "confidence" else lift
+            keep  = (ant_support != 0) & (cons_support != 0) & (value >= min_threshold)
+
+        rows, cols = np.nonzero(keep)
+        parts.append((
+            np.asarray(positions)[rows], cols,
+            ant_pos[rows, cols], cons_pos[rows, cols],
+            rule_support[rows, 0], confidence[rows, cols], lift[rows, cols],
+            leverage[rows, cols], np.minimum(conviction[rows, cols], 999.0),
+        ))
+
+    if not parts:
+        return []
+    pos, col, ant, cons, sup, conf, lift, lev, conv = (
+        np.concatenate([p[i] for p in parts]) for i in range(9)
+    )
+    lift_r = np.array(_round_list(lift, 6))
+
+    # Highest lift first; ties keep itemset / combination order.  Both rule
+    # sides are themselves frequent, so their input frozensets are reused.
+    ranked = np.lexsort((col, pos, -lift_r))
+    return [{
+        "antecedents": a,
+        "consequents": c,
+        "support":     s,
+        "confidence":  cf,
+        "lift":        lf,
+        "leverage":    lv,
+        "conviction":  cv,
+    } for a, c, s, cf, lf, lv, cv in zip(
+        itemsets[ant[ranked]].tolist(),
+        itemsets[cons[ranked]].tolist(),
+        _round_list(sup[ranked], 6),
+        _round_list(conf[ranked], 6),
+        lift_r[ranked].tolist(),
+        _round_list(lev[ranked], 6),
+        _round_list(conv[ranked], 4),
+    )]
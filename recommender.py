@@ -5,15 +5,101 @@ Import this module in Streamlit and anywhere else you need recommendations.
 
 import pickle
 import sqlite3
+import threading
+import numpy as np
 import pandas as pd
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
+
+from fp_growth_engine import njit   # Numba JIT, or a no-op shim when Numba is missing
 
 BASE_DIR   = Path(__file__).parent
 RULES_PKL  = BASE_DIR / "models" / "association_rules.pkl"
+RULES_PQ   = BASE_DIR / "models" / "association_rules.parquet"
 ITEMS_PKL  = BASE_DIR / "models" / "all_items.pkl"
 DB_PATH    = BASE_DIR / "data"    / "retail_store.db"
 
+RECOMMEND_CACHE_SIZE = 1024
+SQL_CACHE_SIZE       = 32
+
+METRIC_COLS = ["support", "confidence", "lift", "leverage", "conviction"]
+TEXT_COLS   = ["antecedents_str", "consequents_str"]
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.execute("PRAGMA query_only=1")
+    conn.execute("PRAGMA cache_size=-65536")      # 64 MiB page cache
+    conn.execute("PRAGMA mmap_size=268435456")    # 256 MiB memory-mapped reads
+    return conn
+
+
+# ─── Shared read-only connection + memoised SQL results ───────────────────────
+_db_lock = threading.Lock()
+_db_conn: Optional[sqlite3.Connection] = None
+
+
+def _db_version() -> int:
+    """Changes whenever 02_clean_and_store.py rewrites the database."""
+    return DB_PATH.stat().st_mtime_ns
+
+
+def _shared_conn() -> sqlite3.Connection:
+    """Open the shared connection on first use; call with _db_lock held."""
+    global _db_conn
+    if _db_conn is None:
+        _db_conn = _connect()
+    return _db_conn
+
+
+@lru_cache(maxsize=SQL_CACHE_SIZE)
+def _read_sql(sql: str, db_version: int) -> pd.DataFrame:
+    with _db_lock:
+        return pd.read_sql(sql, _shared_conn())
+
+
+@lru_cache(maxsize=SQL_CACHE_SIZE)
+def _fetchone(sql: str, db_version: int) -> tuple:
+    """Cached single-row read with no DataFrame in between."""
+    with _db_lock:
+        return _shared_conn().execute(sql).fetchone()
+
+
+def _query(sql: str) -> pd.DataFrame:
+    """Cached read; callers get their own copy of the frame."""
+    return _read_sql(sql, _db_version()).copy()
+
+
+def _itemsets_to_csr(itemsets, item_to_id) -> Tuple[np.ndarray, np.ndarray]:
+    """Flatten itemsets into sorted item IDs (int16 when the catalogue fits) plus int64 offsets."""
+    id_dtype = np.int16 if len(item_to_id) <= np.iinfo(np.int16).max else np.int32
+    rows = [sorted(item_to_id[x] for x in s) for s in itemsets]
+    lengths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    items = np.fromiter(chain.from_iterable(rows), dtype=id_dtype, count=offsets[-1])
+    return items, offsets
+
+
+@njit(cache=True)
+def _match_rules(candidates, ant_offsets, ant_items, in_basket, conf, lift, min_conf, min_lift):
+    """Flag candidate rules whose antecedents (CSR item IDs) all sit in the basket."""
+    fires = np.zeros(candidates.shape[0], dtype=np.bool_)
+    for k in range(candidates.shape[0]):
+        r = candidates[k]
+        if conf[r] < min_conf or lift[r] < min_lift:
+            continue
+        ok = True
+        for j in range(ant_offsets[r], ant_offsets[r + 1]):
+            if not in_basket[ant_items[j]]:
+                ok = False
+                break
+        fires[k] = ok
+    return fires
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 class RecommendationEngine:
@@ -27,33 +113,81 @@ class RecommendationEngine:
 
     def __init__(self):
         self.rules: Optional[pd.DataFrame] = None
-        self.all_items: Optional[List[str]] = None
+        self.all_items: Optional[Tuple[str, ...]] = None
         self._load()
 
     # ── Load model ─────────────────────────────────────────────────────────────
     def _load(self):
-        if not RULES_PKL.exists():
+        # Fresh memo per load so a reloaded model never serves stale results
+        self._recommend_cached = lru_cache(maxsize=RECOMMEND_CACHE_SIZE)(self._recommend_impl)
+
+        if RULES_PQ.exists():
+            # Columnar model (03_train_model.py --parquet): itemsets come back
+            # as lists and are converted below
+            self.rules = pd.read_parquet(RULES_PQ)
+        elif not RULES_PKL.exists():
             raise FileNotFoundError(
                 f"Model not found at {RULES_PKL}. "
                 "Run scripts/03_train_model.py first."
             )
-        with open(RULES_PKL, "rb") as f:
-            self.rules = pickle.load(f)
+        else:
+            with open(RULES_PKL, "rb") as f:
+                self.rules = pickle.load(f)
 
         # Ensure antecedents/consequents are frozensets
         if "antecedents" in self.rules.columns:
-            self.rules["antecedents"] = self.rules["antecedents"].apply(
-                lambda x: frozenset(x) if not isinstance(x, frozenset) else x
-            )
-            self.rules["consequents"] = self.rules["consequents"].apply(
-                lambda x: frozenset(x) if not isinstance(x, frozenset) else x
-            )
+            for col in ("antecedents", "consequents"):
+                sets = self.rules[col].to_numpy()
+                if len(sets) and not isinstance(sets[0], frozenset):
+                    self.rules[col] = np.fromiter(map(frozenset, sets), dtype=object, count=len(sets))
+
+        # Downcast: float32 metrics, Arrow-backed strings
+        self.rules = self.rules.astype(
+            {c: "float32" for c in METRIC_COLS if c in self.rules.columns}
+        ).astype(
+            {c: "string[pyarrow]" for c in TEXT_COLS if c in self.rules.columns}
+        )
+
+        # One lower-cased text column for the Rules page search
+        if all(c in self.rules.columns for c in TEXT_COLS):
+            self.rules["_search_blob"] = (
+                self.rules["antecedents_str"] + " | " + self.rules["consequents_str"]
+            ).str.lower()
+
+        # Structure-of-arrays view for the vectorised recommend() path:
+        # itemsets as CSR integer item IDs, metrics as parallel float32 columns
+        if "antecedents" in self.rules.columns:
+            antecedents   = self.rules["antecedents"].to_numpy()
+            consequents   = self.rules["consequents"].to_numpy()
+            self._conf    = self.rules["confidence"].to_numpy()
+            self._lift    = self.rules["lift"].to_numpy()
+            self._support = self.rules["support"].to_numpy()
+            if "antecedents_str" in self.rules.columns:
+                self._based_on = self.rules["antecedents_str"].to_numpy(dtype=object)
+            else:
+                self._based_on = np.array([", ".join(sorted(a)) for a in antecedents], dtype=object)
+
+            self._item_names  = np.array(sorted(set().union(*antecedents, *consequents)), dtype=object)
+            self._item_to_id  = {item: i for i, item in enumerate(self._item_names)}
+            self._ant_items, self._ant_offsets = _itemsets_to_csr(antecedents, self._item_to_id)
+            self._con_items, self._con_offsets = _itemsets_to_csr(consequents, self._item_to_id)
+
+            # Inverted index: each rule is posted under its rarest antecedent item,
+            # so only rules keyed by a basket item can possibly fire
+            ant_freq = Counter(chain.from_iterable(antecedents))
+            postings = defaultdict(list)
+            for idx, ants in enumerate(antecedents):
+                postings[min(ants, key=lambda x: (ant_freq[x], x))].append(idx)
+            self._postings = {
+                item: np.array(ids, dtype=np.intp) for item, ids in postings.items()
+            }
 
         if ITEMS_PKL.exists():
             with open(ITEMS_PKL, "rb") as f:
-                self.all_items = pickle.load(f)
+                self.all_items = tuple(pickle.load(f))
         else:
-            self.all_items = []
+            self.all_items = ()
+        self._items_lower = tuple(item.lower() for item in self.all_items)
 
     # ── Core recommendation function ───────────────────────────────────────────
     def recommend(
@@ -73,43 +207,141 @@ class RecommendationEngine:
             return pd.DataFrame()
 
         input_set = frozenset([i.strip().title() for i in input_items])
-        results   = []
-
-        for _, rule in self.rules.iterrows():
-            antecedents = rule["antecedents"]
-            consequents = rule["consequents"]
-
-            # Rule fires if ALL antecedent items are in the basket
-            if antecedents.issubset(input_set):
-                confidence = rule["confidence"]
-                lift       = rule["lift"]
-                support    = rule["support"]
-
-                if confidence < min_confidence or lift < min_lift:
-                    continue
-
-                for product in consequents:
-                    if product not in input_set:   # don't recommend what's in basket
-                        results.append({
-                            "product":    product,
-                            "confidence": round(confidence, 4),
-                            "lift":       round(lift, 4),
-                            "support":    round(support, 4),
-                            "based_on":   ", ".join(sorted(antecedents)),
-                        })
-
-        if not results:
-            return pd.DataFrame(columns=["product","confidence","lift","support","based_on"])
 
-        # Deduplicate: keep best lift per product
-        rec_df = pd.DataFrame(results)
-        rec_df = (
-            rec_df.sort_values("lift", ascending=False)
-                  .drop_duplicates(subset=["product"])
-                  .head(top_n)
-                  .reset_index(drop=True)
+        # Callers get their own copy; the cached frame stays untouched
+        return self._recommend_cached(input_set, top_n, min_confidence, min_lift).copy()
+
+    def _recommend_impl(
+        self,
+        input_set: frozenset,
+        top_n: int,
+        min_confidence: float,
+        min_lift: float,
+    ) -> pd.DataFrame:
+        # Candidate rules, kept in rule-table order
+        posted = [self._postings[x] for x in input_set if x in self._postings]
+        candidates = np.sort(np.concatenate(posted)) if posted else np.empty(0, dtype=np.intp)
+
+        # Rule fires if ALL antecedent items are in the basket
+        in_basket = self._basket_vector(input_set)
+        fires = _match_rules(
+            candidates, self._ant_offsets, self._ant_items, in_basket,
+            self._conf, self._lift,
+            self._conf.dtype.type(min_confidence), self._lift.dtype.type(min_lift),
         )
-        return rec_df
+        return self._rank(candidates[fires], in_basket, top_n)
+
+    def recommend_batch(
+        self,
+        baskets: List[List[str]],
+        top_n: int = 5,
+        min_confidence: float = 0.0,
+        min_lift: float = 1.0,
+    ) -> List[pd.DataFrame]:
+        """
+        Recommend for several baskets in one pass over the rule table.
+
+        Matching and ranking both run on the whole (basket × rule) matrix at
+        once, so there is no per-basket groupby. Results bypass the
+        recommend() memo. Returns one DataFrame per basket, in the same shape
+        as recommend().
+        """
+        if self.rules is None or len(self.rules) == 0:
+            return [pd.DataFrame() for _ in baskets]
+        if not baskets:
+            return []
+
+        in_baskets = np.stack([
+            self._basket_vector(frozenset([i.strip().title() for i in basket]))
+            for basket in baskets
+        ])
+
+        # (baskets × rules): antecedent items present per rule vs. antecedent length
+        hits  = np.add.reduceat(in_baskets[:, self._ant_items], self._ant_offsets[:-1],
+                                axis=1, dtype=np.int32)
+        fires = hits == np.diff(self._ant_offsets)
+        fires &= ((self._conf >= self._conf.dtype.type(min_confidence))
+                  & (self._lift >= self._lift.dtype.type(min_lift)))
+
+        # One row per (basket, fired rule, consequent not already in that basket)
+        basket_of, matched = np.nonzero(fires)
+        starts = self._con_offsets[matched]
+        lens   = self._con_offsets[matched + 1] - starts
+        rows   = np.repeat(matched, lens)
+        owner  = np.repeat(basket_of, lens)
+        items  = self._con_items[np.arange(lens.sum()) + np.repeat(starts - (np.cumsum(lens) - lens), lens)]
+        keep   = ~in_baskets[owner, items]
+        rows, owner, items = rows[keep], owner[keep], items[keep]
+        lift   = self._lift[rows].astype(np.float64).round(4)
+
+        # Best lift per (basket, product); ties go to the earliest rule, as in _rank()
+        pos   = np.arange(len(rows))
+        order = np.lexsort((pos, -lift, items, owner))
+        first = np.ones(len(order), dtype=np.bool_)
+        first[1:] = (owner[order[1:]] != owner[order[:-1]]) | (items[order[1:]] != items[order[:-1]])
+        best  = order[first]
+        seen  = np.minimum.reduceat(pos[order], np.flatnonzero(first)) if len(order) else pos
+
+        # Per basket: highest lift first, products in first-seen order on ties, top_n of each
+        best   = best[np.lexsort((seen, -lift[best], owner[best]))]
+        bounds = np.searchsorted(owner[best], np.arange(len(baskets) + 1))
+        best   = best[np.arange(len(best)) - np.repeat(bounds[:-1], np.diff(bounds)) < max(top_n, 0)]
+        bounds = np.searchsorted(owner[best], np.arange(len(baskets) + 1))
+        has_rows = np.bincount(owner, minlength=len(baskets)) > 0
+
+        sel        = rows[best]
+        product    = self._item_names[items[best]]
+        confidence = self._conf[sel].astype(np.float64).round(4)
+        support    = self._support[sel].astype(np.float64).round(4)
+        based_on   = self._based_on[sel]
+        lift       = lift[best]
+
+        return [
+            pd.DataFrame({
+                "product":    product[lo:hi],
+                "confidence": confidence[lo:hi],
+                "lift":       lift[lo:hi],
+                "support":    support[lo:hi],
+                "based_on":   based_on[lo:hi],
+            }) if nonempty else pd.DataFrame(columns=["product","confidence","lift","support","based_on"])
+            for lo, hi, nonempty in zip(bounds[:-1], bounds[1:], has_rows)
+        ]
+
+    def _basket_vector(self, input_set: frozenset) -> np.ndarray:
+        """Boolean mask over rule item IDs; items no rule mentions are ignored."""
+        in_basket = np.zeros(len(self._item_names), dtype=np.bool_)
+        in_basket[[self._item_to_id[x] for x in input_set if x in self._item_to_id]] = True
+        return in_basket
+
+    def _rank(self, matched: np.ndarray, in_basket: np.ndarray, top_n: int) -> pd.DataFrame:
+        """Expand fired rules to products, keep each product's best lift, return the top_n."""
+        # One row per consequent not already in the basket (CSR segment gather)
+        starts = self._con_offsets[matched]
+        lens   = self._con_offsets[matched + 1] - starts
+        rows   = np.repeat(matched, lens)
+        items  = self._con_items[np.arange(lens.sum()) + np.repeat(starts - (np.cumsum(lens) - lens), lens)]
+        keep   = ~in_basket[items]
+        rows, items = rows[keep], items[keep]
+
+        if len(rows) == 0:
+            return pd.DataFrame(columns=["product","confidence","lift","support","based_on"])
+
+        lift = self._lift[rows].astype(np.float64).round(4)
+
+        # Deduplicate: keep best lift per product, then take the top_n of those
+        best = pd.Series(lift).groupby(items, sort=False).idxmax().to_numpy()
+        if 0 < top_n < len(best):
+            best = best[np.argpartition(-lift[best], top_n - 1)[:top_n]]
+        best = best[np.argsort(-lift[best], kind="stable")][:max(top_n, 0)]
+        sel  = rows[best]
+
+        return pd.DataFrame({
+            "product":    self._item_names[items[best]],
+            "confidence": self._conf[sel].astype(np.float64).round(4),
+            "lift":       lift[best],
+            "support":    self._support[sel].astype(np.float64).round(4),
+            "based_on":   self._based_on[sel],
+        })
 
     # ── Fuzzy product search ───────────────────────────────────────────────────
     def search_items(self, query: str, max_results: int = 10) -> List[str]:
@@ -117,7 +349,8 @@ class RecommendationEngine:
         q = query.strip().lower()
         if not self.all_items:
             return []
-        return [item for item in self.all_items if q in item.lower()][:max_results]
+        hits = (item for item, low in zip(self.all_items, self._items_lower) if q in low)
+        return list(islice(hits, max_results))
 
     # ── Stats helpers (for Power BI / dashboard) ───────────────────────────────
     def top_rules(self, n: int = 20) -> pd.DataFrame:
@@ -131,63 +364,79 @@ class RecommendationEngine:
         """Return most frequently appearing products in rule consequents."""
         if self.rules is None:
             return pd.DataFrame()
-        prod_series = self.rules["consequents"].explode()
-        counts = prod_series.value_counts().head(n).reset_index()
-        counts.columns = ["product", "rule_appearances"]
-        return counts
+        ids, counts = np.unique(self._con_items, return_counts=True)
+        order = np.argsort(-counts, kind="stable")[:n]
+        return pd.DataFrame({
+            "product":          self._item_names[ids[order]],
+            "rule_appearances": counts[order],
+        })
 
-    def get_all_items(self) -> List[str]:
-        return self.all_items or []
+    def get_all_items(self) -> Tuple[str, ...]:
+        return self.all_items or ()
 
     # ── SQL helpers ────────────────────────────────────────────────────────────
+    @staticmethod
+    def refresh() -> None:
+        """Drop cached SQL results and reopen the database on next use."""
+        global _db_conn
+        _read_sql.cache_clear()
+        _fetchone.cache_clear()
+        with _db_lock:
+            if _db_conn is not None:
+                _db_conn.close()
+                _db_conn = None
+
+    @staticmethod
+    def get_kpis() -> Tuple[int, int, int]:
+        """(transactions, unique products, items sold) in a single query."""
+        total_tx, total_prod, total_qty = _fetchone(
+            """
+            SELECT (SELECT COUNT(DISTINCT InvoiceID)     FROM Transactions),
+                   (SELECT COUNT(DISTINCT Product)       FROM Transactions),
+                   (SELECT COALESCE(SUM(Quantity), 0)    FROM Transactions)
+            """,
+            _db_version(),
+        )
+        return total_tx, total_prod, total_qty
+
     @staticmethod
     def get_product_frequency(top_n: int = 30) -> pd.DataFrame:
-        conn = sqlite3.connect(DB_PATH)
-        df   = pd.read_sql(
+        df = _query(
             f"""
             SELECT Product, SUM(Quantity) as TotalQty, COUNT(*) as Frequency
             FROM Transactions
             GROUP BY Product
             ORDER BY Frequency DESC
-            LIMIT {top_n}
-            """,
-            conn
+            LIMIT {int(top_n)}
+            """
         )
-        conn.close()
-        return df
+        return df.astype({"Product": "category"})
 
     @staticmethod
     def get_monthly_sales() -> pd.DataFrame:
-        conn = sqlite3.connect(DB_PATH)
-        df   = pd.read_sql(
+        return _query(
             """
-            SELECT substr(Date,1,7) as Month,
+            SELECT Month,
                    COUNT(DISTINCT InvoiceID) as Transactions,
                    SUM(Quantity) as TotalItems
             FROM Transactions
             GROUP BY Month
             ORDER BY Month
-            """,
-            conn
+            """
         )
-        conn.close()
-        return df
 
     @staticmethod
     def get_category_sales() -> pd.DataFrame:
-        conn = sqlite3.connect(DB_PATH)
-        df   = pd.read_sql(
+        df = _query(
             """
             SELECT Country, COUNT(DISTINCT InvoiceID) as Transactions
             FROM Transactions
             WHERE Country IS NOT NULL AND Country != 'Unknown'
             GROUP BY Country
             ORDER BY Transactions DESC
-            """,
-            conn
+            """
         )
-        conn.close()
-        return df
+        return df.astype({"Country": "category"})
 
 
 # ─── CLI Quick-test ────────────────────────────────────────────────────────────
@@ -202,8 +451,7 @@ if __name__ == "__main__":
         ["Pasta", "Cheese"],
         ["Tea"],
     ]
-    for basket in test_baskets:
-        recs = engine.recommend(basket, top_n=3)
+    for basket, recs in zip(test_baskets, engine.recommend_batch(test_baskets, top_n=3)):
         print(f"Input: {basket}")
         if recs.empty:
             print("  → No recommendations found")
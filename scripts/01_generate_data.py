@@ -5,10 +5,7 @@ Run this if you don't have the Kaggle dataset yet.
 
 import pandas as pd
 import numpy as np
-import random
-from datetime import datetime, timedelta
 
-random.seed(42)
 np.random.seed(42)
 
 # ─── Product catalog ───────────────────────────────────────────────────────────
@@ -54,52 +51,50 @@ BASKET_PATTERNS = [
     ["Eggs", "Milk", "Cheese"],
 ]
 
-def generate_invoice_id(i):
-    return f"INV{str(100000 + i).zfill(6)}"
-
-def random_date():
-    start = datetime(2023, 1, 1)
-    return start + timedelta(days=random.randint(0, 364))
-
-rows = []
+COUNTRIES = np.array(["United Kingdom", "Germany", "France", "India", "USA"])
 n_transactions = 3000
 
-for i in range(n_transactions):
-    invoice = generate_invoice_id(i)
-    date = random_date()
-
-    # Pick a base pattern, sometimes combine two
-    pattern = random.choice(BASKET_PATTERNS).copy()
-    if random.random() < 0.3:
-        pattern += random.choice(BASKET_PATTERNS)
-    pattern = list(set(pattern))
-
-    # Add 1-2 random products occasionally
-    if random.random() < 0.2:
-        all_products = list(PRODUCTS.values())
-        pattern.append(random.choice(all_products))
-
-    for product in pattern:
-        rows.append({
-            "InvoiceNo": invoice,
-            "Description": product,
-            "Quantity": random.randint(1, 5),
-            "InvoiceDate": date.strftime("%Y-%m-%d"),
-            "UnitPrice": round(random.uniform(0.5, 15.0), 2),
-            "CustomerID": random.randint(10000, 19999),
-            "Country": random.choice(["United Kingdom", "Germany", "France", "India", "USA"])
-        })
-
-df = pd.DataFrame(rows)
+# Patterns as a (pattern × product) membership matrix
+product_names = np.array(list(PRODUCTS.values()))
+product_pos   = {p: i for i, p in enumerate(product_names)}
+pattern_matrix = np.zeros((len(BASKET_PATTERNS), len(product_names)), dtype=bool)
+for k, pattern in enumerate(BASKET_PATTERNS):
+    pattern_matrix[k, [product_pos[p] for p in pattern]] = True
+
+# Pick a base pattern per invoice, sometimes combine two
+baskets = pattern_matrix[np.random.randint(0, len(BASKET_PATTERNS), n_transactions)]
+combine = np.random.random(n_transactions) < 0.3
+baskets[combine] |= pattern_matrix[np.random.randint(0, len(BASKET_PATTERNS), combine.sum())]
+
+# Add a random product occasionally
+extra = np.flatnonzero(np.random.random(n_transactions) < 0.2)
+baskets[extra, np.random.randint(0, len(product_names), len(extra))] = True
+
+# One row per (invoice, product); invoice-level columns expand by gather
+invoice_idx, product_idx = np.nonzero(baskets)
+n_rows   = len(invoice_idx)
+invoices = np.char.add("INV", (100000 + np.arange(n_transactions)).astype(str))
+dates    = (np.datetime64("2023-01-01")
+            + np.random.randint(0, 365, n_transactions).astype("timedelta64[D]")).astype(str)
+
+df = pd.DataFrame({
+    "InvoiceNo":   invoices[invoice_idx],
+    "Description": product_names[product_idx],
+    "Quantity":    np.random.randint(1, 6, n_rows),
+    "InvoiceDate": dates[invoice_idx],
+    "UnitPrice":   np.round(np.random.uniform(0.5, 15.0, n_rows), 2),
+    "CustomerID":  np.random.randint(10000, 20000, n_rows),
+    "Country":     COUNTRIES[np.random.randint(0, len(COUNTRIES), n_rows)],
+})
 
 # Inject some noise to clean later
-cancel_idx = random.sample(range(len(df)), 50)
-df.loc[cancel_idx, "InvoiceNo"] = df.loc[cancel_idx, "InvoiceNo"].apply(lambda x: "C" + x)
+cancel_idx = np.random.choice(n_rows, 50, replace=False)
+df.loc[cancel_idx, "InvoiceNo"] = "C" + df.loc[cancel_idx, "InvoiceNo"]
 
-neg_idx = random.sample(range(len(df)), 30)
+neg_idx = np.random.choice(n_rows, 30, replace=False)
 df.loc[neg_idx, "Quantity"] = -df.loc[neg_idx, "Quantity"]
 
-null_idx = random.sample(range(len(df)), 40)
+null_idx = np.random.choice(n_rows, 40, replace=False)
 df.loc[null_idx, "Description"] = None
 
 df.to_csv("data/raw_retail.csv", index=False)
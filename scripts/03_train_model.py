@@ -2,6 +2,7 @@
 Phase 2 – Steps 4, 5, 6: Basket encoding → FP-Growth → Association Rules
 """
 
+import numpy as np
 import pandas as pd
 import sqlite3
 import pickle
@@ -13,6 +14,7 @@ from fp_growth_engine import fpgrowth, association_rules
 DB_PATH    = "data/retail_store.db"
 RULES_CSV  = "models/association_rules.csv"
 RULES_PKL  = "models/association_rules.pkl"
+RULES_PQ   = "models/association_rules.parquet"   # written with --parquet
 ITEMS_PKL  = "models/all_items.pkl"
 os.makedirs("models", exist_ok=True)
 
@@ -25,13 +27,17 @@ print(f"   {len(df):,} rows | {df['InvoiceID'].nunique():,} invoices | {df['Prod
 
 # Group by invoice → list of products (our format)
 print("\n🛒 Building basket lists...")
-baskets = df.groupby("InvoiceID")["Product"].apply(list).tolist()
+# (stable sort by invoice, then split the product column at invoice boundaries)
+df = df.sort_values("InvoiceID", kind="mergesort")
+codes, _ = pd.factorize(df["InvoiceID"].to_numpy())
+boundaries = np.flatnonzero(np.diff(codes)) + 1
+baskets = [b.tolist() for b in np.split(df["Product"].to_numpy(), boundaries)]
 print(f"   Total baskets: {len(baskets):,}")
 
 # Save item list
 all_items = sorted(df["Product"].unique().tolist())
 with open(ITEMS_PKL, "wb") as f:
-    pickle.dump(all_items, f)
+    pickle.dump(all_items, f, protocol=pickle.HIGHEST_PROTOCOL)
 print(f"   Saved {len(all_items)} unique items → {ITEMS_PKL}")
 
 # ─── Step 5: FP-Growth ─────────────────────────────────────────────────────────
@@ -59,13 +65,13 @@ import pandas as pd
 rules = pd.DataFrame(rules_list)
 
 # Add readable string columns
-rules["antecedents_str"] = rules["antecedents"].apply(lambda x: ", ".join(sorted(x)))
-rules["consequents_str"] = rules["consequents"].apply(lambda x: ", ".join(sorted(x)))
+rules["antecedents_str"] = [", ".join(sorted(a)) for a in rules["antecedents"].to_numpy()]
+rules["consequents_str"] = [", ".join(sorted(c)) for c in rules["consequents"].to_numpy()]
 
-# Round metrics
-for col in ["support", "confidence", "lift", "leverage", "conviction"]:
-    if col in rules.columns:
-        rules[col] = rules[col].round(4)
+# Round metrics, then store them as float32 (4 decimals fit comfortably)
+metric_cols = [c for c in ["support", "confidence", "lift", "leverage", "conviction"]
+               if c in rules.columns]
+rules[metric_cols] = rules[metric_cols].round(4).astype("float32")
 
 rules.sort_values("lift", ascending=False, inplace=True)
 rules.reset_index(drop=True, inplace=True)
@@ -73,15 +79,26 @@ rules.reset_index(drop=True, inplace=True)
 print(f"   ✅ {len(rules):,} quality rules generated")
 print(f"\n   Top 5 rules by lift:")
 top = rules[["antecedents_str", "consequents_str", "confidence", "lift"]].head(5)
-for _, row in top.iterrows():
-    print(f"   [{row['antecedents_str']}] → [{row['consequents_str']}]  "
-          f"conf={row['confidence']:.2f}  lift={row['lift']:.2f}")
+for ant, con, conf, lift in top.itertuples(index=False, name=None):
+    print(f"   [{ant}] → [{con}]  "
+          f"conf={conf:.2f}  lift={lift:.2f}")
 
 # Save
 rules.to_csv(RULES_CSV, index=False)
 print(f"\n💾 Saved rules CSV → {RULES_CSV}")
 
 with open(RULES_PKL, "wb") as f:
-    pickle.dump(rules, f)
+    pickle.dump(rules, f, protocol=pickle.HIGHEST_PROTOCOL)
 print(f"💾 Saved rules pickle → {RULES_PKL}")
+
+# Optional columnar copy; the engine prefers it when present, so drop a stale one
+if "--parquet" in sys.argv:
+    pq_rules = rules.assign(
+        antecedents=[sorted(a) for a in rules["antecedents"].to_numpy()],
+        consequents=[sorted(c) for c in rules["consequents"].to_numpy()],
+    )
+    pq_rules.to_parquet(RULES_PQ, index=False)
+    print(f"💾 Saved rules Parquet → {RULES_PQ}")
+elif os.path.exists(RULES_PQ):
+    os.remove(RULES_PQ)
 print("\n🏁 Phase 2 complete! Model ready.")
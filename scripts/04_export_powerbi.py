@@ -1,12 +1,13 @@
 """
 Phase 5: Export data for Power BI Dashboard
-Run this to generate Excel/CSV files that Power BI can connect to.
+Run this to generate Parquet/CSV files that Power BI can connect to.
 """
 
 import pandas as pd
 import sqlite3
 import pickle
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -19,48 +20,60 @@ OUT_DIR.mkdir(exist_ok=True, parents=True)
 
 print("📊 Preparing Power BI exports...\n")
 
-# ─── 1. Transactions summary ───────────────────────────────────────────────────
-conn = sqlite3.connect(DB_PATH)
+def read_query(sql: str) -> pd.DataFrame:
+    """Run one aggregate on its own connection (one per worker thread)."""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return pd.read_sql(sql, conn)
+    finally:
+        conn.close()
 
-tx = pd.read_sql("""
-    SELECT
-        Product,
-        SUM(Quantity)                    AS TotalQuantity,
-        COUNT(*)                         AS TransactionCount,
-        COUNT(DISTINCT InvoiceID)        AS UniqueInvoices,
-        SUM(Quantity * COALESCE(UnitPrice,0)) AS Revenue
-    FROM Transactions
-    GROUP BY Product
-    ORDER BY TotalQuantity DESC
-""", conn)
-tx.to_csv(OUT_DIR / "product_summary.csv", index=False)
-print(f"✅ product_summary.csv      ({len(tx)} rows)")
 
-# ─── 2. Monthly trend ─────────────────────────────────────────────────────────
-monthly = pd.read_sql("""
-    SELECT
-        substr(Date,1,7) AS Month,
-        COUNT(DISTINCT InvoiceID) AS Transactions,
-        SUM(Quantity)             AS ItemsSold
-    FROM Transactions
-    GROUP BY Month ORDER BY Month
-""", conn)
-monthly.to_csv(OUT_DIR / "monthly_trend.csv", index=False)
-print(f"✅ monthly_trend.csv        ({len(monthly)} rows)")
+def export(df: pd.DataFrame, name: str, unit: str = "rows") -> None:
+    """Write Parquet (typed, zstd) for Power BI plus the CSV kept for older reports."""
+    df.to_parquet(OUT_DIR / f"{name}.parquet", index=False, compression="zstd")
+    df.to_csv(OUT_DIR / f"{name}.csv", index=False)
+    print(f"✅ {name + '.parquet/csv':<32} ({len(df)} {unit})")
 
-# ─── 3. Country breakdown ─────────────────────────────────────────────────────
-country = pd.read_sql("""
-    SELECT Country,
-           COUNT(DISTINCT InvoiceID) AS Transactions,
-           SUM(Quantity)             AS ItemsSold
-    FROM Transactions
-    WHERE Country IS NOT NULL AND Country != 'Unknown'
-    GROUP BY Country ORDER BY Transactions DESC
-""", conn)
-country.to_csv(OUT_DIR / "country_breakdown.csv", index=False)
-print(f"✅ country_breakdown.csv    ({len(country)} rows)")
 
-conn.close()
+QUERIES = {
+    # ─── 1. Transactions summary ───────────────────────────────────────────────
+    "product_summary": """
+        SELECT
+            Product,
+            SUM(Quantity)                    AS TotalQuantity,
+            COUNT(*)                         AS TransactionCount,
+            COUNT(DISTINCT InvoiceID)        AS UniqueInvoices,
+            SUM(Quantity * COALESCE(UnitPrice,0)) AS Revenue
+        FROM Transactions
+        GROUP BY Product
+        ORDER BY TotalQuantity DESC
+    """,
+    # ─── 2. Monthly trend ─────────────────────────────────────────────────────
+    "monthly_trend": """
+        SELECT
+            Month,
+            COUNT(DISTINCT InvoiceID) AS Transactions,
+            SUM(Quantity)             AS ItemsSold
+        FROM Transactions
+        GROUP BY Month ORDER BY Month
+    """,
+    # ─── 3. Country breakdown ─────────────────────────────────────────────────
+    "country_breakdown": """
+        SELECT Country,
+               COUNT(DISTINCT InvoiceID) AS Transactions,
+               SUM(Quantity)             AS ItemsSold
+        FROM Transactions
+        WHERE Country IS NOT NULL AND Country != 'Unknown'
+        GROUP BY Country ORDER BY Transactions DESC
+    """,
+}
+
+# Each aggregate walks its own index, so run them side by side
+with ThreadPoolExecutor(max_workers=len(QUERIES)) as pool:
+    results = dict(zip(QUERIES, pool.map(read_query, QUERIES.values())))
+for name, df in results.items():
+    export(df, name)
 
 # ─── 4. Association rules ─────────────────────────────────────────────────────
 with open(RULES_PKL, "rb") as f:
@@ -68,20 +81,18 @@ with open(RULES_PKL, "rb") as f:
 
 pbi_rules = rules[["antecedents_str","consequents_str","support","confidence","lift"]].copy()
 pbi_rules.columns = ["Antecedents","Consequents","Support","Confidence","Lift"]
-pbi_rules.to_csv(OUT_DIR / "association_rules.csv", index=False)
-print(f"✅ association_rules.csv    ({len(pbi_rules)} rules)")
+export(pbi_rules, "association_rules", "rules")
 
 # ─── 5. Top bundles ───────────────────────────────────────────────────────────
 top_bundles = pbi_rules.nlargest(30, "Lift").copy()
 top_bundles["Bundle"] = top_bundles["Antecedents"] + " → " + top_bundles["Consequents"]
-top_bundles.to_csv(OUT_DIR / "top_bundles.csv", index=False)
-print(f"✅ top_bundles.csv          ({len(top_bundles)} bundles)")
+export(top_bundles, "top_bundles", "bundles")
 
 print(f"\n📁 All exports → {OUT_DIR}")
 print("\n Power BI Setup:")
 print("  1. Open Power BI Desktop")
-print("  2. Get Data → Text/CSV")
-print("  3. Import each CSV file")
+print("  2. Get Data → Parquet (or Text/CSV)")
+print("  3. Import each export file")
 print("  4. Create relationships on 'Product' column")
 print("  5. Build visuals:")
 print("     • Bar chart: product_summary → TotalQuantity")